@@ -6,14 +6,21 @@ PythonAnywhere用Flaskアプリケーション
 PythonAnywhere環境に最適化された設定
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, make_response
 import os
 import json
 import csv
 from datetime import datetime
 import threading
 import uuid
-from crawler_web import WebCrawlerRender
+import hashlib
+from crawler_web import WebCrawlerRender, CancelToken, CSV_COLUMNS, result_to_csv_row
+from results_query import query_results, DEFAULT_PER_PAGE
+from results_store import ResultsStore, RunWriter
+from seo_audit import SeoAudit
+from shard_crawl import ShardCoordinator
+from exporters import ExportError, available_formats, export_filename, export_results, mimetype_for
+from assets import init_assets
 
 # Flaskアプリケーションの初期化
 app = Flask(__name__)
@@ -24,14 +31,29 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
 app.config['DEBUG'] = False  # 本番環境ではFalse
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # セッション有効期限: 1時間
 
+# ハッシュ付き・圧縮済みの静的ファイル配信
+init_assets(app)
+
+# 描画済みページのキャッシュ（フラッシュメッセージがない場合のみ使用）
+rendered_pages = {}
+
 # Renderでは制限なし
 MAX_PAGES_LIMIT = 1000  # Renderでは制限なし
 
+# 1回のクロールの制限時間（秒）
+CRAWL_DEADLINE = int(os.environ.get('CRAWL_DEADLINE', 1800))
+
+# 分散クロールのワーカープロセス数（1の場合はこのプロセス内でクロール）
+CRAWL_SHARDS = int(os.environ.get('CRAWL_SHARDS', 1))
+
 # 結果保存フォルダ
 RESULTS_FOLDER = 'results'
 if not os.path.exists(RESULTS_FOLDER):
     os.makedirs(RESULTS_FOLDER)
 
+# クロール結果のSQLiteストア（実行間の比較用）
+results_store = ResultsStore(os.path.join(RESULTS_FOLDER, 'crawl_results.db'))
+
 # グローバル変数（進捗管理）
 crawl_progress = {
     'is_running': False,
@@ -43,9 +65,27 @@ crawl_progress = {
     'start_time': None
 }
 
+# SEO監査の集計（クロール中に逐次更新）
+crawl_audit = SeoAudit()
+
 # アクティブなクロールの管理（セッションID別）
 active_crawls = {}
 
+def render_page(template_name):
+    """変化しないページを描画済みのHTMLから返す（ETagによる304応答付き）"""
+    if session.get('_flashes'):
+        return render_template(template_name)
+    
+    if template_name not in rendered_pages:
+        html = render_template(template_name)
+        rendered_pages[template_name] = (html, hashlib.sha256(html.encode('utf-8')).hexdigest()[:16])
+    html, etag = rendered_pages[template_name]
+    
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
     """メインページ"""
@@ -53,16 +93,16 @@ def index():
     if 'crawl_session_id' in session:
         session_id = session['crawl_session_id']
         if session_id in active_crawls:
-            active_crawls[session_id]['stop_flag'] = True
+            active_crawls[session_id]['cancel_token'].cancel()
             del active_crawls[session_id]
         session.pop('crawl_session_id', None)
     
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route('/crawl', methods=['POST'])
 def crawl():
     """クロール開始"""
-    global crawl_progress, active_crawls
+    global crawl_progress, crawl_audit, active_crawls
     
     try:
         url = request.form.get('url', '').strip()
@@ -83,7 +123,7 @@ def crawl():
         
         # 既存のクロールを停止
         if session_id in active_crawls:
-            active_crawls[session_id]['stop_flag'] = True
+            active_crawls[session_id]['cancel_token'].cancel()
         
         # 新しいクロールの進捗を初期化
         crawl_progress = {
@@ -97,20 +137,24 @@ def crawl():
             'session_id': session_id
         }
         
+        crawl_audit = SeoAudit()
+        
         # アクティブクロールに追加
-        active_crawls[session_id] = {
+        entry = {
             'progress': crawl_progress,
-            'stop_flag': False,
+            'audit': crawl_audit,
+            'cancel_token': CancelToken(),
             'thread': None
         }
+        active_crawls[session_id] = entry
         
         # バックグラウンドでクロール実行
-        thread = threading.Thread(target=crawl_background, args=(url, max_pages, session_id))
+        thread = threading.Thread(target=crawl_background, args=(url, max_pages, session_id, entry))
         thread.daemon = True
-        thread.start()
         
         # スレッドを保存
-        active_crawls[session_id]['thread'] = thread
+        entry['thread'] = thread
+        thread.start()
         
         return redirect(url_for('progress'))
         
@@ -118,47 +162,75 @@ def crawl():
         flash(f'エラーが発生しました: {str(e)}', 'error')
         return redirect(url_for('index'))
 
-def crawl_background(url, max_pages, session_id):
-    """バックグラウンドでクロール実行"""
-    global crawl_progress, active_crawls
+def crawl_background(url, max_pages, session_id, entry):
+    """バックグラウンドでクロール実行
+
+    進捗・集計は crawl() で登録した entry のものにだけ書き込む
+    （スレッド開始前に active_crawls から削除された場合や、中断後に
+    新しいクロールが始まった場合でも、その進捗を正しく終了させるため）
+    """
+    global active_crawls
     
+    progress = entry['progress']
+    audit = entry['audit']
+    cancel_token = entry['cancel_token']
+    
+    def remove_active_crawl():
+        # 同じセッションIDで別のクロールが登録されている場合は削除しない
+        if active_crawls.get(session_id, {}).get('cancel_token') is cancel_token:
+            del active_crawls[session_id]
+    
+    run_writer = None
     try:
-        crawler = WebCrawlerRender()
+        if CRAWL_SHARDS > 1:
+            crawler = ShardCoordinator(shards=CRAWL_SHARDS)
+        else:
+            crawler = WebCrawlerRender()
+        run_writer = RunWriter(results_store, results_store.start_run(url))
+        progress['run_id'] = run_writer.run_id
+        
+        def on_result(result):
+            run_writer.add(result)
+            audit.add(result)
         
         def update_progress(current, total, status):
             # セッションが有効かチェック
-            if session_id not in active_crawls or active_crawls[session_id]['stop_flag']:
+            if session_id not in active_crawls or cancel_token.is_cancelled():
                 return False  # クロール停止
             
-            crawl_progress['current_page'] = current
-            crawl_progress['total_pages'] = total
-            crawl_progress['percentage'] = int((current / total) * 100) if total > 0 else 0
-            crawl_progress['status'] = status
+            progress['current_page'] = current
+            progress['total_pages'] = total
+            progress['percentage'] = int((current / total) * 100) if total > 0 else 0
+            progress['status'] = status
             return True
         
-        results = crawler.crawl_website_with_progress(url, max_pages, update_progress)
+        results = crawler.crawl_website_with_progress(url, max_pages, update_progress,
+                                                      result_callback=on_result,
+                                                      cancel_token=cancel_token,
+                                                      deadline=CRAWL_DEADLINE)
         
-        # セッションが有効な場合のみ結果を保存
-        if session_id in active_crawls and not active_crawls[session_id]['stop_flag']:
-            crawl_progress['results'] = results
-            crawl_progress['is_running'] = False
-            crawl_progress['status'] = f'完了！ {len(results)}件のページを収集しました'
+        # 中断された場合もそれまでの結果は保持する
+        progress['results'] = results
+        progress['is_running'] = False
+        if not cancel_token.is_cancelled():
+            run_writer.close('completed')
+            progress['status'] = f'完了！ {len(results)}件のページを収集しました'
         else:
-            crawl_progress['is_running'] = False
-            crawl_progress['status'] = 'クロールが中断されました'
+            run_writer.close('cancelled')
+            progress['status'] = f'クロールが中断されました（{len(results)}件のページを収集済み）'
         
         # アクティブクロールから削除
-        if session_id in active_crawls:
-            del active_crawls[session_id]
+        remove_active_crawl()
         
     except Exception as e:
-        crawl_progress['is_running'] = False
-        crawl_progress['status'] = f'エラー: {str(e)}'
+        progress['is_running'] = False
+        progress['status'] = f'エラー: {str(e)}'
         print(f"クロールエラー: {str(e)}")  # Renderのログに出力
+        if run_writer:
+            run_writer.close('error')
         
         # アクティブクロールから削除
-        if session_id in active_crawls:
-            del active_crawls[session_id]
+        remove_active_crawl()
 
 @app.route('/progress')
 def progress():
@@ -168,12 +240,24 @@ def progress():
         flash('セッションが無効です。新しいクロールを開始してください。', 'warning')
         return redirect(url_for('index'))
     
-    return render_template('progress.html')
+    return render_page('progress.html')
 
 @app.route('/api/progress')
 def api_progress():
-    """進捗API"""
-    return jsonify(crawl_progress)
+    """進捗API
+
+    結果一覧は include_results=1 の場合のみ含める（ポーリングの通信量削減のため）
+    進捗が変わっていなければ304を返す
+    """
+    progress = {key: value for key, value in crawl_progress.items() if key != 'results'}
+    progress['result_count'] = len(crawl_progress['results'])
+    if request.args.get('include_results') == '1':
+        progress['results'] = crawl_progress['results']
+    
+    response = jsonify(progress)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/results')
 def show_results():
@@ -194,42 +278,76 @@ def show_results():
     
     # JSONファイルに保存
     with open(json_filepath, 'w', encoding='utf-8') as f:
-        json.dump(crawl_progress['results'], f, ensure_ascii=False, indent=2)
+        json.dump(crawl_progress['results'], f, ensure_ascii=False)
     
     # CSVファイルに保存
     with open(csv_filepath, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
-        writer.writerow(['URL', 'Index Status', 'Title', 'H1', 'H2-1', 'H2-2', 'H2-3', 'Description', 'Canonical URL', 'Is Redirect', 'Redirect Chain', 'Final URL', 'Status Code'])
+        writer.writerow([header for header, _ in CSV_COLUMNS])
         for result in crawl_progress['results']:
-            writer.writerow([
-                result['url'],
-                result['index_status'],
-                result['title'],
-                result['h1'],
-                result['h2_1'],
-                result['h2_2'],
-                result['h2_3'],
-                result['description'],
-                result['canonical_url'],
-                result['is_redirect'],
-                result['redirect_chain'],
-                result['final_url'],
-                result['status_code']
-            ])
+            writer.writerow(result_to_csv_row(result))
     
     return render_template('results.html', 
-                         results=crawl_progress['results'], 
                          json_filename=json_filename,
                          csv_filename=csv_filename,
-                         total_count=len(crawl_progress['results']))
+                         total_count=len(crawl_progress['results']),
+                         per_page=DEFAULT_PER_PAGE,
+                         export_formats=available_formats(),
+                         audit=crawl_audit.summary(limit=5))
+
+@app.route('/api/results')
+def api_results():
+    """結果一覧API（サーバー側で絞り込み・並び替え・ページング）"""
+    return jsonify(query_results(crawl_progress['results'], request.args, crawl_audit))
+
+@app.route('/api/audit')
+def api_audit():
+    """SEO監査の要約API（クロール中も取得可能）"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(crawl_audit.summary(limit=limit))
+
+@app.route('/api/runs')
+def api_runs():
+    """保存済みクロール実行の一覧API"""
+    return jsonify(results_store.list_runs())
+
+@app.route('/api/runs/<int:base_run_id>/diff/<int:target_run_id>')
+def api_run_diff(base_run_id, target_run_id):
+    """2つのクロール実行の差分API（新規・削除・変更ページ）"""
+    if not results_store.get_run(base_run_id) or not results_store.get_run(target_run_id):
+        return jsonify({'error': 'クロール実行が見つかりません'}), 404
+    limit = request.args.get('limit', 1000, type=int)
+    return jsonify(results_store.diff_runs(base_run_id, target_run_id, limit))
+
+@app.route('/export/<fmt>')
+def export_file(fmt):
+    """圧縮・列指向形式で結果を書き出してダウンロード"""
+    if not crawl_progress['results']:
+        flash('結果がありません', 'warning')
+        return redirect(url_for('index'))
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = export_filename(f'crawl_results_{timestamp}', fmt) if fmt in available_formats() else None
+    if not filename:
+        flash(f'未対応の出力形式です: {fmt}', 'error')
+        return redirect(url_for('show_results'))
+    
+    try:
+        export_results(crawl_progress['results'], os.path.join(RESULTS_FOLDER, filename), fmt)
+    except ExportError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('show_results'))
+    
+    return redirect(url_for('download_file', filename=filename))
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    """結果ファイルのダウンロード"""
+    """結果ファイルのダウンロード（ファイルから分割して送信）"""
     try:
         file_path = os.path.join(RESULTS_FOLDER, filename)
         if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True)
+            return send_file(file_path, as_attachment=True, mimetype=mimetype_for(filename),
+                             conditional=True, max_age=0)
         else:
             flash('ファイルが見つかりません', 'error')
             return redirect(url_for('index'))
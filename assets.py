@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+静的ファイルの配信
+起動時にCSS/JSのハッシュ付きファイル名と圧縮済みデータを用意し、
+長期キャッシュ可能なヘッダー付きで配信する
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request, url_for
+
+try:
+    import brotli
+except ImportError:  # 任意の依存
+    brotli = None
+
+# 事前圧縮する静的ファイル（static フォルダからの相対パス）
+PRECOMPRESSED_ASSETS = ('css/style.css', 'js/main.js')
+
+# ハッシュ付きファイル名は内容が変わると変わるため1年間キャッシュさせる
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    """圧縮済みの静的ファイル"""
+
+    def __init__(self, content, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(content).hexdigest()
+        self.variants = {'identity': content}
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            self.variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(content, quality=11)
+            if len(compressed) < len(content):
+                self.variants['br'] = compressed
+
+    def etag(self, encoding):
+        return f'{self.digest[:16]}-{encoding}'
+
+
+def fingerprinted_name(path, digest):
+    """style.css -> style.<ハッシュ>.css"""
+    base, extension = os.path.splitext(path)
+    return f'{base}.{digest[:10]}{extension}'
+
+
+def build_manifest(static_folder, paths=PRECOMPRESSED_ASSETS):
+    """元のパス -> ハッシュ付きパス、ハッシュ付きパス -> Asset の対応表を作成"""
+    manifest = {}
+    assets = {}
+    for path in paths:
+        file_path = os.path.join(static_folder, path)
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        asset = Asset(content, mimetype)
+        name = fingerprinted_name(path, asset.digest)
+        manifest[path] = name
+        assets[name] = asset
+    return manifest, assets
+
+
+def _choose_encoding(asset):
+    """Accept-Encoding に応じて配信する形式を選択（br > gzip > 無圧縮）"""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+
+def init_assets(app):
+    """アプリにハッシュ付き静的ファイルの配信を登録
+
+    テンプレートでは asset_url('css/style.css') でURLを生成する
+    """
+    manifest, assets = build_manifest(app.static_folder)
+
+    def asset_url(path):
+        if path in manifest:
+            return url_for('serve_asset', filename=manifest[path])
+        return url_for('static', filename=path)
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        """ハッシュ付き静的ファイルの配信"""
+        asset = assets.get(filename)
+        if asset is None:
+            return Response(status=404)
+
+        encoding = _choose_encoding(asset)
+        etag = asset.etag(encoding)
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL,
+            'ETag': f'"{etag}"',
+            'Vary': 'Accept-Encoding',
+        }
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    return manifest
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+コマンドライン用一括クロール
+開始URLを記載したファイルを読み込み、複数サイトを並列にクロールする
+Flaskを経由しないため夜間バッチなどで利用可能
+
+使用例:
+    python crawl_cli.py urls.txt --output-dir results/batch --format jsonl --workers 9
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from crawler_web import WebCrawlerRender, CancelToken, CSV_COLUMNS, result_to_csv_row
+from results_store import ResultsStore, RunWriter
+from fetch_policy import FetchPolicy
+from shard_crawl import ShardCoordinator
+
+# 1サイトあたりの並列数（WebCrawlerRenderの既定値と同じ）
+DEFAULT_WORKERS_PER_SITE = 3
+
+
+def load_start_urls(path):
+    """開始URLファイルを読み込む（空行と#から始まる行は無視）"""
+    urls = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            url = line.strip()
+            if not url or url.startswith('#'):
+                continue
+            if not url.startswith(('http://', 'https://')):
+                url = 'http://' + url
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+def output_path_for(url, output_dir, fmt, index):
+    """サイトごとの出力ファイルパスを生成"""
+    netloc = urlparse(url).netloc or 'site'
+    safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', netloc)
+    return os.path.join(output_dir, f'{index:03d}_{safe_name}.{fmt}')
+
+
+class _SiteWriter:
+    """1サイト分の結果を逐次ファイルへ書き出す"""
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.count = 0
+        if fmt == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow([header for header, _ in CSV_COLUMNS])
+
+    def write(self, result):
+        if self.fmt == 'csv':
+            self.writer.writerow(result_to_csv_row(result))
+        else:
+            record = {key: value for key, value in result.items() if key != 'new_links'}
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def crawl_site(url, max_pages, workers_per_site, path, fmt, quiet=False, store=None,
+               cancel_token=None, deadline=None, hedge=False, shards=1):
+    """1サイトをクロールして結果をファイルへストリーム出力
+
+    shards が2以上の場合は workers_per_site をワーカープロセスで分け合う
+    （各ワーカーに1スレッド以上必要なため、shards は workers_per_site までに抑える）
+    """
+    shards = max(1, min(shards, workers_per_site))
+    if shards > 1:
+        workers_per_site = max(1, workers_per_site // shards)  # ワーカーごとのスレッド数
+        crawler = ShardCoordinator(shards=shards, threads_per_shard=workers_per_site, hedge=hedge)
+    else:
+        crawler = WebCrawlerRender(FetchPolicy(hedge=hedge))
+    writer = _SiteWriter(path, fmt)
+    run_writer = RunWriter(store, store.start_run(url)) if store else None
+    status_codes = {}
+    error_pages = 0
+
+    def on_result(result):
+        nonlocal error_pages
+        writer.write(result)
+        if run_writer:
+            run_writer.add(result)
+        code = result.get('status_code')
+        status_codes[code] = status_codes.get(code, 0) + 1
+        if result.get('index_status') == 'error':
+            error_pages += 1  # 再試行しても取得できなかったページ
+
+    def on_progress(current, total, status):
+        if not quiet:
+            print(f'[{url}] {status}', file=sys.stderr)
+        return True
+
+    start = time.time()
+    run_status = 'error'
+    try:
+        crawler.crawl_website_with_progress(url, max_pages, on_progress,
+                                            max_workers=workers_per_site,
+                                            result_callback=on_result,
+                                            cancel_token=cancel_token,
+                                            deadline=deadline)
+        run_status = 'cancelled' if crawler.cancel_token.is_cancelled() else 'completed'
+    finally:
+        writer.close()
+        if run_writer:
+            run_writer.close(run_status)
+        if isinstance(crawler, WebCrawlerRender):
+            crawler.close()
+
+    return {
+        'url': url,
+        'output': path,
+        'run_id': run_writer.run_id if run_writer else None,
+        'pages': writer.count - error_pages,
+        'error_pages': error_pages,
+        'status_codes': status_codes,
+        'elapsed': round(time.time() - start, 2),
+    }
+
+
+def run_batch(urls, output_dir, fmt='jsonl', max_pages=50, workers=DEFAULT_WORKERS_PER_SITE,
+              workers_per_site=DEFAULT_WORKERS_PER_SITE, quiet=False, db_path=None,
+              deadline=None, hedge=False, shards=1):
+    """複数サイトを全体の並列数の範囲内でクロール"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 全体の並列数を超えないようにサイト単位の同時実行数を決める
+    workers_per_site = max(1, min(workers_per_site, workers))
+    # 分散クロールは各ワーカーに1スレッド以上必要なため、ワーカー数も1サイトの並列数までに抑える
+    shards = max(1, min(shards, workers_per_site))
+    site_requests = max(1, workers_per_site // shards) * shards  # 1サイトの実際の並列数
+    site_concurrency = max(1, workers // site_requests)
+    store = ResultsStore(db_path) if db_path else None
+    cancel_token = CancelToken()
+
+    sites = []
+    executor = ThreadPoolExecutor(max_workers=site_concurrency)
+    try:
+        futures = {
+            executor.submit(crawl_site, url, max_pages, workers_per_site,
+                            output_path_for(url, output_dir, fmt, index), fmt, quiet, store,
+                            cancel_token, deadline, hedge, shards): url
+            for index, url in enumerate(urls)
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                sites.append(future.result())
+            except Exception as e:
+                print(f'サイトクロールエラー {url}: {str(e)}', file=sys.stderr)
+                sites.append({'url': url, 'output': None, 'pages': 0, 'error_pages': 0,
+                              'status_codes': {}, 'elapsed': 0, 'error': str(e)})
+    except KeyboardInterrupt:
+        # Ctrl+Cで全サイトを中断（出力済みの結果は残す）
+        print('中断しています...', file=sys.stderr)
+        cancel_token.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        collected = {site['url'] for site in sites}
+        for future, url in futures.items():
+            if url not in collected and not future.cancelled() and future.exception() is None:
+                sites.append(future.result())
+    finally:
+        executor.shutdown(wait=True)
+
+    return sites
+
+
+def summarize(sites, elapsed):
+    """サイト別結果から全体の集計を作成
+
+    pages は取得できたページ数（エラーのページは error_pages）で、
+    1ページも取得できなかったサイトは失敗として扱う
+    """
+    total_pages = sum(site['pages'] for site in sites)
+    failed = [site['url'] for site in sites if site.get('error') or site['pages'] == 0]
+    return {
+        'sites': len(sites),
+        'pages': total_pages,
+        'error_pages': sum(site.get('error_pages', 0) for site in sites),
+        'failed_sites': failed,
+        'elapsed': round(elapsed, 2),
+        'pages_per_second': round(total_pages / elapsed, 2) if elapsed > 0 else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='複数サイトを一括クロールしてJSONL/CSVに出力')
+    parser.add_argument('url_file', help='開始URLを1行に1件記載したファイル')
+    parser.add_argument('--output-dir', default=os.path.join('results', 'batch'),
+                        help='出力先フォルダ（既定: results/batch）')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl',
+                        help='出力形式（既定: jsonl）')
+    parser.add_argument('--max-pages', type=int, default=50, help='1サイトあたりの最大ページ数')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS_PER_SITE,
+                        help='全サイト合計の並列リクエスト数')
+    parser.add_argument('--workers-per-site', type=int, default=DEFAULT_WORKERS_PER_SITE,
+                        help='1サイトあたりの並列リクエスト数')
+    parser.add_argument('--db', help='結果を保存するSQLiteファイル（省略時は保存しない）')
+    parser.add_argument('--deadline', type=float, help='1サイトあたりの制限時間（秒）')
+    parser.add_argument('--hedge', action='store_true', help='応答の遅いリクエストを追加で送信する')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='1サイトを分担するワーカープロセス数（2以上で分散クロール、'
+                             '--workers-per-site が上限）')
+    parser.add_argument('--quiet', action='store_true', help='進捗を表示しない')
+    args = parser.parse_args(argv)
+
+    urls = load_start_urls(args.url_file)
+    if not urls:
+        print('開始URLがありません', file=sys.stderr)
+        return 2
+
+    start = time.time()
+    sites = run_batch(urls, args.output_dir, args.format, args.max_pages,
+                      args.workers, args.workers_per_site, args.quiet, args.db,
+                      args.deadline, args.hedge, args.shards)
+    summary = summarize(sites, time.time() - start)
+    summary['site_results'] = sorted(sites, key=lambda site: site['url'])
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if summary['failed_sites'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,7 @@ Selenium + requests + BeautifulSoupで動作
 
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urlsplit, urldefrag
 import time
 import re
 from datetime import datetime
@@ -19,24 +19,180 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import threading
+from itertools import islice
+from concurrent.futures import wait, FIRST_COMPLETED
+from fetch_policy import FetchPolicy, RETRYABLE_EXCEPTIONS
+
+# 待ちキューの最大件数
+MAX_QUEUE_SIZE = 100
+
+# CSV出力の列定義（見出し, 結果キー）
+CSV_COLUMNS = [
+    ('URL', 'url'),
+    ('Index Status', 'index_status'),
+    ('Title', 'title'),
+    ('H1', 'h1'),
+    ('H2-1', 'h2_1'),
+    ('H2-2', 'h2_2'),
+    ('H2-3', 'h2_3'),
+    ('Description', 'description'),
+    ('Canonical URL', 'canonical_url'),
+    ('Is Redirect', 'is_redirect'),
+    ('Redirect Chain', 'redirect_chain'),
+    ('Final URL', 'final_url'),
+    ('Status Code', 'status_code'),
+]
+
+def result_to_csv_row(result):
+    """結果1件をCSVの行に変換"""
+    return [result[key] for _, key in CSV_COLUMNS]
+
+# リンク収集で除外するスキームと拡張子
+SKIP_LINK_PREFIXES = ('mailto:', 'javascript:', 'tel:', 'data:')
+ASSET_EXTENSIONS = frozenset((
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp',
+    '.css', '.js', '.json', '.pdf', '.zip', '.gz', '.rar',
+    '.mp3', '.mp4', '.mov', '.avi', '.webm',
+    '.woff', '.woff2', '.ttf', '.eot',
+))
+_SCHEME_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+def iter_page_links(soup, page_url, netloc, seen_urls):
+    """ページ内の同一ホストへのリンクを順に返すジェネレータ
+
+    - 解決前にホストを判定し、外部リンクはurljoinしない
+    - ページ内の重複、mailto:等のスキーム、画像などのファイルを除外
+    - seen_urls（キュー投入済みURL）に含まれるものはロックなしで除外
+    """
+    page_hrefs = set()  # 生のhrefによる簡易な重複除外
+    page_urls = set()  # 解決後のURLによる重複除外
+    for tag in soup.find_all('a', href=True):
+        href = tag['href'].strip()
+        if not href or href.startswith('#') or href in page_hrefs:
+            continue
+        page_hrefs.add(href)
+        
+        if href.lower().startswith(SKIP_LINK_PREFIXES):
+            continue
+        
+        # 絶対URL・プロトコル相対URLはホストを先に確認
+        if href.startswith('//') or _SCHEME_RE.match(href):
+            parts = urlsplit(href)
+            if parts.netloc != netloc or parts.scheme not in ('', 'http', 'https'):
+                continue
+        
+        absolute_url = urldefrag(urljoin(page_url, href))[0]
+        if absolute_url in page_urls:
+            continue
+        page_urls.add(absolute_url)
+        
+        path = urlsplit(absolute_url).path
+        dot = path.rfind('.')
+        if dot > path.rfind('/') and path[dot:].lower() in ASSET_EXTENSIONS:
+            continue
+        
+        if absolute_url in seen_urls:
+            continue
+        yield absolute_url
+
+class CrawlCancelled(Exception):
+    """クロールがキャンセルされたことを示す例外"""
+
+class CrawlDeadlineExceeded(CrawlCancelled):
+    """クロール全体の制限時間を超えたことを示す例外"""
+
+class CancelToken:
+    """クロールのキャンセル通知
+
+    cancel() を呼ぶと、クロールのキュー処理と取得中のリクエストの両方が停止する
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+    
+    def cancel(self):
+        """キャンセルを要求（登録済みのコールバックを1度だけ実行）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"キャンセル処理エラー: {str(e)}")
+    
+    def is_cancelled(self):
+        return self._event.is_set()
+    
+    def wait(self, timeout):
+        """キャンセルされるか timeout 秒経過するまで待機（キャンセル時はTrue）"""
+        return self._event.wait(timeout)
+    
+    def add_callback(self, callback):
+        """キャンセル時に呼び出す処理を登録（キャンセル済みなら即時実行）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def remove_callback(self, callback):
+        """登録済みのコールバックを解除（未登録なら何もしない）"""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+    
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CrawlCancelled()
 
 class WebCrawlerRender:
     """Render用Webクローラー"""
     
-    def __init__(self):
+    def __init__(self, fetch_policy=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         self.visited_urls = set()
+        self.seen_urls = set()
         self.results = []
+        self.lock = threading.Lock()
+        self.cancel_token = CancelToken()
+        self.fetch_policy = fetch_policy or FetchPolicy()
+        self._hedge_executor = None
+        self._deadline_at = None
+    
+    def close(self):
+        """HTTPセッションを閉じる"""
+        self.stop_hedging()
+        self.session.close()
+    
+    def start_hedging(self, workers):
+        """ヘッジ用のスレッドプールを用意（fetch_policy.hedge が有効な場合のみ）"""
+        if self.fetch_policy.hedge and self._hedge_executor is None:
+            # 各ページの本来のリクエストとヘッジ用リクエストが同時に走れる数を確保
+            self._hedge_executor = ThreadPoolExecutor(max_workers=workers * 2)
     
-    def extract_page_info(self, url, response):
+    def stop_hedging(self):
+        """ヘッジ用のスレッドプールを停止"""
+        if self._hedge_executor:
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+            self._hedge_executor = None
+    
+    def extract_page_info(self, url, response, soup=None):
         """ページ情報を抽出"""
         try:
-            soup = BeautifulSoup(response.content, 'html5lib')
+            if soup is None:
+                soup = BeautifulSoup(response.content, 'html5lib')
             
             # タイトル
             title = soup.find('title')
@@ -89,21 +245,25 @@ class WebCrawlerRender:
             
         except Exception as e:
             print(f"ページ情報抽出エラー {url}: {str(e)}")
-            return {
-                'url': url,
-                'title': '',
-                'h1': '',
-                'h2_1': '',
-                'h2_2': '',
-                'h2_3': '',  # 速度アップのため空文字
-                'description': '',  # メタディスクリプション
-                'canonical_url': '',
-                'index_status': 'error',
-                'is_redirect': False,  # 速度アップのため固定値
-                'redirect_chain': '',  # 速度アップのため空文字
-                'final_url': url,  # 速度アップのため元URLと同じ
-                'status_code': response.status_code
-            }
+            return self._error_page_info(url, response.status_code)
+    
+    def _error_page_info(self, url, status_code=None):
+        """取得・抽出に失敗したページの情報"""
+        return {
+            'url': url,
+            'title': '',
+            'h1': '',
+            'h2_1': '',
+            'h2_2': '',
+            'h2_3': '',  # 速度アップのため空文字
+            'description': '',  # メタディスクリプション
+            'canonical_url': '',
+            'index_status': 'error',
+            'is_redirect': False,  # 速度アップのため固定値
+            'redirect_chain': '',  # 速度アップのため空文字
+            'final_url': url,  # 速度アップのため元URLと同じ
+            'status_code': status_code
+        }
     
     def get_redirect_info(self, response):
         """リダイレクト情報を取得"""
@@ -121,15 +281,37 @@ class WebCrawlerRender:
             'final_url': final_url
         }
     
-    def crawl_website_with_progress(self, start_url, max_pages=50, progress_callback=None):
-        """ウェブサイトをクロール（進捗コールバック付き）"""
+    def crawl_website_with_progress(self, start_url, max_pages=50, progress_callback=None,
+                                    max_workers=3, result_callback=None, cancel_token=None,
+                                    deadline=None):
+        """ウェブサイトをクロール（進捗コールバック付き）
+
+        result_callback を指定すると、ページ情報を1件取得するたびに呼び出される
+        cancel_token をキャンセルするか progress_callback が False を返すと
+        取得中のリクエストを打ち切り、それまでに収集した結果を返す
+        deadline（秒）を指定すると、その時間内に取得できた結果を返す
+        """
+        if progress_callback is None:
+            progress_callback = lambda current, total, status: True
+        
+        self.cancel_token = cancel_token or CancelToken()
+        # キャンセル時は接続を即座に閉じる
+        self.cancel_token.add_callback(self.session.close)
+        
+        self._deadline_at = time.monotonic() + deadline if deadline else None
+        
+        def report(current, status):
+            if progress_callback(current, max_pages, status) is False:
+                self.cancel_token.cancel()
+        
         try:
             # 高速化設定
-            MAX_WORKERS = 3  # 並列処理数（無料プランでは控えめに）
+            MAX_WORKERS = max_workers  # 並列処理数（無料プランでは控えめに）
             
             # 開始URLをキューに追加
             queue = [start_url]
             self.visited_urls = set()
+            self.seen_urls = {start_url}  # キューに投入済みのURL
             self.results = []
             self.lock = threading.Lock()
             
@@ -137,9 +319,12 @@ class WebCrawlerRender:
             parsed_start = urlparse(start_url)
             base_domain = f"{parsed_start.scheme}://{parsed_start.netloc}"
             
-            progress_callback(0, max_pages, "高速クロール開始...")
+            report(0, "高速クロール開始...")
             
-            while queue and len(self.results) < max_pages:
+            self.start_hedging(MAX_WORKERS)
+            
+            while (queue and len(self.results) < max_pages
+                   and not self.cancel_token.is_cancelled() and not self._deadline_passed()):
                 # 並列処理用のURLバッチを作成
                 batch_size = min(MAX_WORKERS, len(queue), max_pages - len(self.results))
                 batch_urls = []
@@ -152,41 +337,202 @@ class WebCrawlerRender:
                     break
                 
                 # 並列処理でページを取得
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+                try:
                     futures = [executor.submit(self._process_single_page, url, parsed_start) for url in batch_urls]
                     
                     for future in futures:
                         try:
-                            result = future.result(timeout=15)  # タイムアウト短縮
+                            result = self._wait_result(future, timeout=self._task_timeout())
                             if result:
                                 with self.lock:
+                                    new_links = result.pop('new_links', [])
                                     self.results.append(result)
+                                    if result_callback:
+                                        result_callback(result)
                                     
                                     # 進捗を更新
                                     current_count = len(self.results)
-                                    progress_callback(current_count, max_pages, f"高速収集中: {current_count}/{max_pages}ページ完了")
+                                    report(current_count, f"高速収集中: {current_count}/{max_pages}ページ完了")
                                     
                                     # 新しいリンクをキューに追加
-                                    if result.get('new_links'):
-                                        for link in result['new_links']:
-                                            if (link not in self.visited_urls and 
-                                                link not in queue and 
-                                                len(queue) < 100):  # キューサイズ制限
-                                                queue.append(link)
+                                    for link in new_links:
+                                        if len(queue) >= MAX_QUEUE_SIZE:  # キューサイズ制限
+                                            break
+                                        if link not in self.seen_urls:
+                                            self.seen_urls.add(link)
+                                            queue.append(link)
+                        except CrawlCancelled:
+                            break
                         except Exception as e:
                             print(f"並列処理エラー: {str(e)}")
                             continue
+                finally:
+                    # キャンセル・時間切れ時は未実行のタスクを破棄し、実行中のタスクを待たない
+                    abandon = self.cancel_token.is_cancelled() or self._deadline_passed()
+                    executor.shutdown(wait=not abandon, cancel_futures=abandon)
                 
-                # 短い待機時間
-                time.sleep(0.2)
+                # 短い待機時間（キャンセルされたら即座に抜ける）
+                self.cancel_token.wait(0.2)
             
-            progress_callback(len(self.results), max_pages, f"高速完了！ {len(self.results)}件のページを収集しました")
+            if self._deadline_passed():
+                progress_callback(len(self.results), max_pages, f"制限時間に達しました: {len(self.results)}件のページを収集済み")
+            elif self.cancel_token.is_cancelled():
+                progress_callback(len(self.results), max_pages, f"中断しました: {len(self.results)}件のページを収集済み")
+            else:
+                progress_callback(len(self.results), max_pages, f"高速完了！ {len(self.results)}件のページを収集しました")
             return self.results
             
         except Exception as e:
             print(f"クロールエラー: {str(e)}")
             progress_callback(0, max_pages, f"エラー: {str(e)}")
             return []
+        finally:
+            # 共有のトークンにセッションへの参照を残さない
+            self.cancel_token.remove_callback(self.session.close)
+            self.stop_hedging()
+    
+    def _remaining(self):
+        """クロール全体の残り時間（制限なしはNone）"""
+        if self._deadline_at is None:
+            return None
+        return self._deadline_at - time.monotonic()
+    
+    def _deadline_passed(self):
+        remaining = self._remaining()
+        return remaining is not None and remaining <= 0
+    
+    def _task_timeout(self):
+        """1ページの処理を待つ最大時間"""
+        timeout = self.fetch_policy.task_timeout()
+        remaining = self._remaining()
+        return timeout if remaining is None else max(0, min(timeout, remaining))
+    
+    def _wait_result(self, future, timeout):
+        """タスクの結果を待機（キャンセルされたらCrawlCancelledを送出）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.cancel_token.raise_if_cancelled()
+            if self._deadline_passed():
+                raise CrawlDeadlineExceeded()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FuturesTimeoutError(f"{timeout:.1f}秒以内に応答がありません")
+            try:
+                return future.result(timeout=min(0.2, remaining))
+            except FuturesTimeoutError:
+                continue
+    
+    def _fetch(self, url, timeout, abort=None):
+        """ページを取得（キャンセル・時間切れなら読み込み途中でも打ち切る）
+
+        requests の timeout は1回の受信ごとの制限のため、受信の合間に
+        リクエスト全体の経過時間とクロール全体の制限時間を確認する
+        abort（threading.Event）がセットされた場合もその時点で打ち切る
+        レスポンスと本文のバイト列を返す
+        """
+        self.cancel_token.raise_if_cancelled()
+        start = time.monotonic()
+        response = self.session.get(url, timeout=timeout, stream=True)
+        try:
+            # read1 は届いた分だけを返すため、少しずつ届く応答でも合間に確認できる
+            # （raw は圧縮されたままのため gzip などは decode_content=True で展開する）
+            if hasattr(response.raw, 'read1'):
+                chunks_iter = iter(lambda: response.raw.read1(65536, decode_content=True), b'')
+            else:
+                chunks_iter = response.iter_content(chunk_size=8192)
+            
+            chunks = []
+            for chunk in chunks_iter:
+                self.cancel_token.raise_if_cancelled()
+                if abort is not None and abort.is_set():
+                    raise CrawlCancelled()
+                if self._deadline_passed():
+                    raise CrawlDeadlineExceeded()
+                if time.monotonic() - start > timeout:
+                    raise requests.exceptions.ReadTimeout(f"{timeout:.1f}秒以内に受信が完了しませんでした: {url}")
+                chunks.append(chunk)
+            return response, b''.join(chunks)
+        finally:
+            response.close()
+    
+    def _hedged_fetch(self, url, timeout, hedge_delay):
+        """応答が遅い場合に同じリクエストを追加で送り、先に成功した方を使う
+
+        先に成功した時点で、もう一方のリクエストは打ち切る
+        """
+        attempts = {}
+        
+        def submit():
+            abort = threading.Event()
+            future = self._hedge_executor.submit(self._fetch, url, timeout, abort)
+            attempts[future] = abort
+            return future
+        
+        primary = submit()
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+        
+        self.cancel_token.raise_if_cancelled()
+        pending = {primary, submit()}
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        error = e
+            raise error
+        finally:
+            for future in pending:
+                attempts[future].set()
+                future.cancel()
+    
+    def _fetch_with_retry(self, url):
+        """適応タイムアウト・リトライ・ヘッジ付きでページを取得"""
+        host = urlparse(url).netloc
+        policy = self.fetch_policy
+        attempt = 0
+        while True:
+            timeout = policy.timeout_for(host)
+            remaining = self._remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise CrawlDeadlineExceeded()
+                timeout = min(timeout, remaining)
+            
+            start = time.monotonic()
+            try:
+                hedge_delay = policy.hedge_delay_for(host) if self._hedge_executor else None
+                if hedge_delay is not None:
+                    response, content = self._hedged_fetch(url, timeout, hedge_delay)
+                else:
+                    response, content = self._fetch(url, timeout)
+            except RETRYABLE_EXCEPTIONS as e:
+                if attempt >= policy.max_retries:
+                    raise
+                print(f"再試行 {url} ({attempt + 1}/{policy.max_retries}): {str(e)}")
+            else:
+                policy.record(host, time.monotonic() - start)
+                if not policy.should_retry_status(response.status_code) or attempt >= policy.max_retries:
+                    return response, content
+                print(f"再試行 {url} ({attempt + 1}/{policy.max_retries}): ステータス {response.status_code}")
+            
+            # ゆらぎ付きの待機（キャンセル・時間切れなら中断）
+            delay = policy.backoff(attempt)
+            remaining = self._remaining()
+            if remaining is not None and remaining <= delay:
+                raise CrawlDeadlineExceeded()
+            if self.cancel_token.wait(delay):
+                raise CrawlCancelled()
+            attempt += 1
+    
+    def process_page(self, url, start_url):
+        """1ページを取得し、ページ情報（new_links付き）を返す（分散クロールのワーカー用）"""
+        return self._process_single_page(url, urlparse(start_url))
     
     def _process_single_page(self, url, parsed_start):
         """単一ページの処理（並列処理用）"""
@@ -196,31 +542,31 @@ class WebCrawlerRender:
                     return None
                 self.visited_urls.add(url)
             
-            # リクエスト送信（タイムアウト短縮）
-            response = self.session.get(url, timeout=8)
+            # リクエスト送信（ホスト別の適応タイムアウト・リトライ付き）
+            try:
+                response, content = self._fetch_with_retry(url)
+            except RETRYABLE_EXCEPTIONS as e:
+                # 再試行しても取得できなかったページもエラーとして結果に残す
+                print(f"ページ取得エラー {url}: {str(e)}")
+                return self._error_page_info(url)
+            
+            soup = BeautifulSoup(content, 'html5lib')
             
             # ページ情報を抽出（リダイレクト情報は速度アップのため収集停止）
-            page_info = self.extract_page_info(url, response)
+            page_info = self.extract_page_info(url, response, soup)
             
-            # 新しいリンクを収集
+            # 新しいリンクを収集（同一ホストのみ、ページ内重複・収集済みURLは除外）
             new_links = []
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html5lib')
-                links = soup.find_all('a', href=True)
-                
-                for link in links:
-                    href = link.get('href')
-                    if href:
-                        absolute_url = urljoin(url, href)
-                        parsed_url = urlparse(absolute_url)
-                        
-                        if (parsed_url.netloc == parsed_start.netloc and 
-                            not absolute_url.startswith('#')):
-                            new_links.append(absolute_url)
+                # キューに入りきらない分は取り出さない
+                new_links = list(islice(
+                    iter_page_links(soup, url, parsed_start.netloc, self.seen_urls), MAX_QUEUE_SIZE))
             
             page_info['new_links'] = new_links
             return page_info
             
+        except CrawlCancelled:
+            return None
         except Exception as e:
             print(f"ページ処理エラー {url}: {str(e)}")
             return None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+クロール結果の圧縮・列指向エクスポート
+結果を1件ずつファイルへ書き出し、全体をメモリ上に組み立てない
+"""
+
+import gzip
+import json
+
+from crawler_web import CSV_COLUMNS
+
+try:
+    import zstandard
+except ImportError:  # 任意の依存
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 任意の依存
+    pyarrow = None
+
+# 出力する列（new_linksなど内部用の項目は含めない）
+EXPORT_FIELDS = [key for _, key in CSV_COLUMNS]
+
+# Parquetの行グループあたりの件数
+PARQUET_ROW_GROUP_SIZE = 1000
+
+
+class ExportError(Exception):
+    """エクスポートできない場合の例外"""
+
+
+def _export_record(result):
+    return {key: result.get(key) for key in EXPORT_FIELDS}
+
+
+def _write_jsonl(results, f):
+    for result in results:
+        f.write(json.dumps(_export_record(result), ensure_ascii=False).encode('utf-8'))
+        f.write(b'\n')
+
+
+def write_jsonl_gzip(results, path):
+    """gzip圧縮したJSONLで出力"""
+    with gzip.open(path, 'wb', compresslevel=6) as f:
+        _write_jsonl(results, f)
+
+
+def write_jsonl_zstd(results, path):
+    """zstd圧縮したJSONLで出力（zstandardが必要）"""
+    if zstandard is None:
+        raise ExportError('zstd形式の出力には zstandard パッケージが必要です')
+    with open(path, 'wb') as raw:
+        with zstandard.ZstdCompressor(level=3).stream_writer(raw) as f:
+            _write_jsonl(results, f)
+
+
+def write_columns_gzip(results, path):
+    """列ごとに値を並べたJSONをgzip圧縮して出力
+
+    {"columns": [...], "data": {"url": [...], "title": [...], ...}} の形式
+    Parquetが使えない環境でも列単位で読み込めるようにするための形式
+    """
+    with gzip.open(path, 'wb', compresslevel=6) as f:
+        f.write(b'{"columns": ')
+        f.write(json.dumps(EXPORT_FIELDS).encode('utf-8'))
+        f.write(b', "data": {')
+        for index, field in enumerate(EXPORT_FIELDS):
+            if index:
+                f.write(b', ')
+            f.write(json.dumps(field).encode('utf-8'))
+            f.write(b': [')
+            for row_index, result in enumerate(results):
+                if row_index:
+                    f.write(b', ')
+                f.write(json.dumps(result.get(field), ensure_ascii=False).encode('utf-8'))
+            f.write(b']')
+        f.write(b'}}')
+
+
+def write_parquet(results, path):
+    """Parquet形式で出力（pyarrowが必要）"""
+    if pyarrow is None:
+        raise ExportError('Parquet形式の出力には pyarrow パッケージが必要です')
+
+    schema = pyarrow.schema([
+        (key, pyarrow.int32() if key == 'status_code'
+         else pyarrow.bool_() if key == 'is_redirect'
+         else pyarrow.string())
+        for key in EXPORT_FIELDS
+    ])
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        for start in range(0, len(results), PARQUET_ROW_GROUP_SIZE):
+            chunk = [_export_record(result) for result in results[start:start + PARQUET_ROW_GROUP_SIZE]]
+            writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+
+
+# 形式名: (拡張子, 書き出し関数, MIMEタイプ)
+EXPORT_FORMATS = {
+    'jsonl-gzip': ('jsonl.gz', write_jsonl_gzip, 'application/gzip'),
+    'jsonl-zstd': ('jsonl.zst', write_jsonl_zstd, 'application/zstd'),
+    'columns-gzip': ('columns.json.gz', write_columns_gzip, 'application/gzip'),
+    'parquet': ('parquet', write_parquet, 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats():
+    """この環境で出力可能な形式の一覧"""
+    formats = ['jsonl-gzip', 'columns-gzip']
+    if zstandard is not None:
+        formats.append('jsonl-zstd')
+    if pyarrow is not None:
+        formats.append('parquet')
+    return formats
+
+
+def export_filename(base_name, fmt):
+    """形式に応じたファイル名"""
+    return f'{base_name}.{EXPORT_FORMATS[fmt][0]}'
+
+
+def export_results(results, path, fmt):
+    """指定形式で結果を書き出す"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'未対応の形式です: {fmt}')
+    EXPORT_FORMATS[fmt][1](results, path)
+
+
+def mimetype_for(filename):
+    """ファイル名から圧縮形式のMIMEタイプを判定（該当なしはNone）"""
+    for extension, _, mimetype in EXPORT_FORMATS.values():
+        if filename.endswith('.' + extension):
+            return mimetype
+    return None
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+リクエストのタイムアウト・リトライ方針
+ホストごとの応答時間からタイムアウトを決め、接続エラーや5xxはゆらぎ付きの待機後に再試行する
+"""
+
+import math
+import random
+import threading
+from collections import defaultdict, deque
+
+import requests
+
+# リトライ対象の例外
+RETRYABLE_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def percentile(values, q):
+    """値の q パーセンタイル（0〜100、最近傍法）"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FetchPolicy:
+    """ホスト別の適応タイムアウトとリトライ・ヘッジの設定
+
+    - タイムアウト: 直近の応答時間の p95 × timeout_multiplier（min_timeout〜max_timeout の範囲）
+    - リトライ: 接続エラー・タイムアウト・5xx を最大 max_retries 回、フルジッターの指数バックオフで再試行
+    - ヘッジ: hedge=True の場合、p90 を超えても応答がないリクエストに同じリクエストを追加で送る
+    """
+
+    def __init__(self, min_timeout=2.0, max_timeout=8.0, timeout_multiplier=3.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=4.0,
+                 hedge=False, hedge_percentile=90, min_samples=5, window=100):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, host, elapsed):
+        """応答時間（秒）を記録"""
+        with self._lock:
+            self._latencies[host].append(elapsed)
+
+    def _samples(self, host):
+        with self._lock:
+            samples = list(self._latencies.get(host, ()))
+        return samples if len(samples) >= self.min_samples else None
+
+    def timeout_for(self, host):
+        """ホストに対するリクエストのタイムアウト（秒）"""
+        samples = self._samples(host)
+        if samples is None:
+            return self.max_timeout
+        timeout = percentile(samples, 95) * self.timeout_multiplier
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def hedge_delay_for(self, host):
+        """ヘッジリクエストを送るまでの待ち時間（無効・計測不足の場合はNone）"""
+        if not self.hedge:
+            return None
+        samples = self._samples(host)
+        if samples is None:
+            return None
+        return percentile(samples, self.hedge_percentile)
+
+    def should_retry_status(self, status_code):
+        return status_code >= 500
+
+    def backoff(self, attempt):
+        """attempt 回目（0始まり）の再試行前の待ち時間"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def task_timeout(self):
+        """1ページの取得にかかりうる最大時間（リトライ・待機を含む）"""
+        return (self.max_timeout * (self.max_retries + 1)
+                + self.backoff_max * self.max_retries)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+クロール結果の絞り込み・並び替え・ページング
+結果一覧画面のAPIからサーバー側で呼び出す
+"""
+
+from collections import Counter
+
+# 並び替え可能な列
+SORTABLE_FIELDS = ('url', 'title', 'h1', 'h2_1', 'h2_2', 'h2_3', 'description',
+                   'canonical_url', 'is_redirect', 'index_status', 'status_code')
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+def _is_truthy(value):
+    """クエリ文字列の真偽値を判定"""
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _sort_key(field):
+    """列の値で並び替えるキー関数（Noneは空文字扱い）"""
+    if field in ('status_code', 'is_redirect'):
+        return lambda result: result.get(field) or 0
+    return lambda result: (result.get(field) or '').lower()
+
+
+def filter_results(results, status_code=None, index_status=None, missing_h1=False,
+                   duplicate_title=False, audit=None):
+    """条件に一致する結果のみを返す
+
+    audit（SeoAudit）を渡すとタイトル重複の判定に集計済みの情報を使う
+    """
+    is_duplicate_title = None
+    if duplicate_title:
+        if audit is not None:
+            is_duplicate_title = audit.is_duplicate_title
+        else:
+            title_counts = Counter(result['title'] for result in results if result['title'])
+            is_duplicate_title = lambda title: title_counts[title] >= 2
+
+    filtered = []
+    for result in results:
+        if status_code is not None and result['status_code'] != status_code:
+            continue
+        if index_status and result['index_status'] != index_status:
+            continue
+        if missing_h1 and result['h1']:
+            continue
+        if is_duplicate_title is not None and not is_duplicate_title(result['title']):
+            continue
+        filtered.append(result)
+    return filtered
+
+
+def query_results(results, args, audit=None):
+    """リクエストパラメータに従って結果の1ページ分を返す
+
+    args には request.args 相当（get が使える辞書）を渡す
+    """
+    status_code = args.get('status_code')
+    try:
+        status_code = int(status_code) if status_code else None
+    except ValueError:
+        status_code = None
+
+    filtered = filter_results(
+        results,
+        status_code=status_code,
+        index_status=args.get('index_status') or None,
+        missing_h1=_is_truthy(args.get('missing_h1', '')),
+        duplicate_title=_is_truthy(args.get('duplicate_title', '')),
+        audit=audit,
+    )
+
+    sort = args.get('sort', '')
+    if sort in SORTABLE_FIELDS:
+        filtered = sorted(filtered, key=_sort_key(sort), reverse=args.get('order') == 'desc')
+
+    try:
+        per_page = int(args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError:
+        per_page = DEFAULT_PER_PAGE
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    total = len(filtered)
+    pages = max(1, (total + per_page - 1) // per_page)
+    try:
+        page = int(args.get('page', 1))
+    except ValueError:
+        page = 1
+    page = max(1, min(page, pages))
+
+    start = (page - 1) * per_page
+    items = [
+        {key: value for key, value in result.items() if key != 'new_links'}
+        for result in filtered[start:start + per_page]
+    ]
+
+    return {
+        'items': items,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+    }
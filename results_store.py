@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLiteによるクロール結果の保存
+クロール実行（run）ごとにページ情報を保存し、実行間の差分をDB上で算出する
+"""
+
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_url TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    page_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS pages (
+    run_id INTEGER NOT NULL REFERENCES crawl_runs(id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    status_code INTEGER,
+    index_status TEXT,
+    title TEXT,
+    title_hash TEXT,
+    h1 TEXT,
+    h2_1 TEXT,
+    h2_2 TEXT,
+    h2_3 TEXT,
+    description TEXT,
+    description_hash TEXT,
+    canonical_url TEXT,
+    is_redirect INTEGER,
+    redirect_chain TEXT,
+    final_url TEXT,
+    PRIMARY KEY (run_id, url)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url);
+CREATE INDEX IF NOT EXISTS idx_pages_run_status ON pages(run_id, status_code);
+CREATE INDEX IF NOT EXISTS idx_pages_run_title_hash ON pages(run_id, title_hash);
+"""
+
+PAGE_COLUMNS = ('run_id', 'url', 'status_code', 'index_status', 'title', 'title_hash',
+                'h1', 'h2_1', 'h2_2', 'h2_3', 'description', 'description_hash',
+                'canonical_url', 'is_redirect', 'redirect_chain', 'final_url')
+
+# 差分判定に使う列（いずれかが変わっていれば「変更」とみなす）
+DIFF_COLUMNS = ('status_code', 'index_status', 'title_hash', 'description_hash',
+                'h1', 'canonical_url', 'final_url')
+
+_INSERT_PAGE = 'INSERT OR REPLACE INTO pages ({}) VALUES ({})'.format(
+    ', '.join(PAGE_COLUMNS), ', '.join('?' * len(PAGE_COLUMNS)))
+
+
+def text_hash(text):
+    """文字列の短いハッシュ（空文字はNone）"""
+    if not text:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _page_row(run_id, result):
+    """結果1件をpagesテーブルの行に変換"""
+    return (
+        run_id,
+        result['url'],
+        result['status_code'],
+        result['index_status'],
+        result['title'],
+        text_hash(result['title']),
+        result['h1'],
+        result['h2_1'],
+        result['h2_2'],
+        result['h2_3'],
+        result['description'],
+        text_hash(result['description']),
+        result['canonical_url'],
+        int(bool(result['is_redirect'])),
+        result['redirect_chain'],
+        result['final_url'],
+    )
+
+
+class ResultsStore:
+    """クロール結果のSQLiteストア"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    def start_run(self, start_url):
+        """クロール実行を登録してrun IDを返す"""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                'INSERT INTO crawl_runs (start_url, started_at) VALUES (?, ?)',
+                (start_url, datetime.now().isoformat(timespec='seconds')))
+            return cursor.lastrowid
+
+    def insert_pages(self, run_id, results):
+        """ページ情報をまとめて保存"""
+        rows = [_page_row(run_id, result) for result in results]
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(_INSERT_PAGE, rows)
+
+    def finish_run(self, run_id, status='completed'):
+        """クロール実行を完了状態にする"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                '''UPDATE crawl_runs
+                   SET finished_at = ?, status = ?,
+                       page_count = (SELECT COUNT(*) FROM pages WHERE run_id = ?)
+                   WHERE id = ?''',
+                (datetime.now().isoformat(timespec='seconds'), status, run_id, run_id))
+
+    def list_runs(self, limit=50):
+        """最近のクロール実行一覧"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT * FROM crawl_runs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_run(self, run_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM crawl_runs WHERE id = ?', (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def diff_runs(self, base_run_id, target_run_id, limit=1000):
+        """2つの実行間の差分（新規・削除・変更ページ）をDB上で算出"""
+        changed_condition = ' OR '.join(
+            f'base.{column} IS NOT target.{column}' for column in DIFF_COLUMNS)
+        changed_columns = ', '.join(
+            f'base.{column} AS old_{column}, target.{column} AS new_{column}'
+            for column in ('status_code', 'index_status', 'title', 'description',
+                           'h1', 'canonical_url', 'final_url'))
+
+        with closing(self._connect()) as conn:
+            added = conn.execute(
+                '''SELECT target.url, target.status_code, target.title
+                   FROM pages AS target
+                   LEFT JOIN pages AS base ON base.run_id = ? AND base.url = target.url
+                   WHERE target.run_id = ? AND base.url IS NULL
+                   ORDER BY target.url LIMIT ?''',
+                (base_run_id, target_run_id, limit)).fetchall()
+            removed = conn.execute(
+                '''SELECT base.url, base.status_code, base.title
+                   FROM pages AS base
+                   LEFT JOIN pages AS target ON target.run_id = ? AND target.url = base.url
+                   WHERE base.run_id = ? AND target.url IS NULL
+                   ORDER BY base.url LIMIT ?''',
+                (target_run_id, base_run_id, limit)).fetchall()
+            changed = conn.execute(
+                f'''SELECT base.url, {changed_columns}
+                    FROM pages AS base
+                    JOIN pages AS target ON target.run_id = ? AND target.url = base.url
+                    WHERE base.run_id = ? AND ({changed_condition})
+                    ORDER BY base.url LIMIT ?''',
+                (target_run_id, base_run_id, limit)).fetchall()
+
+        return {
+            'base_run_id': base_run_id,
+            'target_run_id': target_run_id,
+            'added': [dict(row) for row in added],
+            'removed': [dict(row) for row in removed],
+            'changed': [dict(row) for row in changed],
+        }
+
+
+class RunWriter:
+    """クロール中の結果をバッファしてまとめて保存する"""
+
+    def __init__(self, store, run_id, batch_size=100):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            self._buffer.append(result)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self.store.insert_pages(self.run_id, batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        self.store.insert_pages(self.run_id, batch)
+
+    def close(self, status='completed'):
+        self.flush()
+        self.store.finish_run(self.run_id, status)
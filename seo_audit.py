@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SEO監査の集計
+クロール中にページ情報を受け取るたびに集計を更新し、結果全体を走査せずに要約を返す
+"""
+
+import heapq
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urljoin
+
+from results_store import text_hash
+
+# 要約に含めるURL・グループの件数
+SUMMARY_SAMPLE_SIZE = 20
+
+
+def _normalize_url(url):
+    """比較用にURLを正規化（フラグメントと末尾のスラッシュを除去）"""
+    return url.split('#', 1)[0].rstrip('/')
+
+
+class SeoAudit:
+    """ページ情報の逐次集計
+
+    タイトル・ディスクリプションはハッシュをキーにURLを保持するため、
+    重複の判定は O(1) で行える
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.page_count = 0
+        self.status_counts = Counter()
+        self.index_status_counts = Counter()
+        self.title_urls = defaultdict(list)
+        self.description_urls = defaultdict(list)
+        self.duplicate_title_hashes = set()
+        self.duplicate_description_hashes = set()
+        self.duplicate_title_pages = 0
+        self.duplicate_description_pages = 0
+        self.missing_title = []
+        self.missing_h1 = []
+        self.missing_description = []
+        self.noindex = []
+        self.canonical_mismatch = []
+
+    def add(self, result):
+        """ページ情報1件を集計に反映"""
+        url = result['url']
+        with self._lock:
+            self.page_count += 1
+            self.status_counts[result.get('status_code')] += 1
+            self.index_status_counts[result.get('index_status')] += 1
+
+            if result.get('index_status') == 'error':
+                return
+
+            self.duplicate_title_pages += self._add_text(
+                result.get('title'), url, self.title_urls,
+                self.duplicate_title_hashes, self.missing_title)
+            self.duplicate_description_pages += self._add_text(
+                result.get('description'), url, self.description_urls,
+                self.duplicate_description_hashes, self.missing_description)
+
+            if not result.get('h1'):
+                self.missing_h1.append(url)
+            if result.get('index_status') == 'noindex':
+                self.noindex.append(url)
+
+            canonical = result.get('canonical_url')
+            if canonical and _normalize_url(urljoin(url, canonical)) != _normalize_url(url):
+                self.canonical_mismatch.append(url)
+
+    @staticmethod
+    def _add_text(text, url, urls_by_hash, duplicate_hashes, missing):
+        """テキストをハッシュ別に登録し、新たに重複となったページ数を返す"""
+        key = text_hash(text)
+        if key is None:
+            missing.append(url)
+            return 0
+        urls = urls_by_hash[key]
+        urls.append(url)
+        if len(urls) == 1:
+            return 0
+        if len(urls) == 2:
+            duplicate_hashes.add(key)
+            return 2
+        return 1
+
+    def is_duplicate_title(self, title):
+        """同じタイトルのページが他にもあるか"""
+        key = text_hash(title)
+        return key in self.duplicate_title_hashes
+
+    def is_duplicate_description(self, description):
+        key = text_hash(description)
+        return key in self.duplicate_description_hashes
+
+    def _duplicate_groups(self, urls_by_hash, duplicate_hashes, limit):
+        groups = heapq.nlargest(limit, (urls_by_hash[key] for key in duplicate_hashes), key=len)
+        return [{'count': len(urls), 'urls': urls[:limit]} for urls in groups]
+
+    def summary(self, limit=SUMMARY_SAMPLE_SIZE):
+        """集計の要約（件数と代表的なURL）"""
+        with self._lock:
+            return {
+                'page_count': self.page_count,
+                'status_codes': {str(code): count for code, count in self.status_counts.items()},
+                'index_status': dict(self.index_status_counts),
+                'duplicate_titles': {
+                    'groups': len(self.duplicate_title_hashes),
+                    'pages': self.duplicate_title_pages,
+                    'samples': self._duplicate_groups(self.title_urls, self.duplicate_title_hashes, limit),
+                },
+                'duplicate_descriptions': {
+                    'groups': len(self.duplicate_description_hashes),
+                    'pages': self.duplicate_description_pages,
+                    'samples': self._duplicate_groups(self.description_urls,
+                                                      self.duplicate_description_hashes, limit),
+                },
+                'missing_title': {'count': len(self.missing_title), 'urls': self.missing_title[:limit]},
+                'missing_h1': {'count': len(self.missing_h1), 'urls': self.missing_h1[:limit]},
+                'missing_description': {'count': len(self.missing_description),
+                                        'urls': self.missing_description[:limit]},
+                'noindex': {'count': len(self.noindex), 'urls': self.noindex[:limit]},
+                'canonical_mismatch': {'count': len(self.canonical_mismatch),
+                                       'urls': self.canonical_mismatch[:limit]},
+            }
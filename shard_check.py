@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分散クロールの動作確認
+ローカルに http.server でテスト用サイトを立ち上げ、ShardCoordinator で全ページを
+重複なく収集できるか、ワーカーが途中で停止しても完了するかを確認する
+（テスト用サイトは偶数ページを gzip 圧縮して返す）
+
+使用例:
+    python shard_check.py --shards 3 --pages 60
+"""
+
+import argparse
+import gzip
+import multiprocessing
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from shard_crawl import ShardCoordinator
+
+
+def make_handler(page_count, delay):
+    """page_count ページが相互にリンクするテスト用サイトのハンドラー"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            try:
+                index = 0 if self.path == '/' else int(self.path.strip('/').split('/')[-1])
+            except ValueError:
+                index = -1
+            if not 0 <= index < page_count:
+                self.send_error(404)
+                return
+            time.sleep(delay)
+            # 次のページと飛び先2件へリンク（トップページ以外は /page/<番号>）
+            targets = {index + 1, (index * 7 + 3) % page_count, (index * 11 + 5) % page_count}
+            links = ''.join(
+                f'<a href="/page/{target}">link</a>'
+                for target in sorted(targets) if 0 < target < page_count
+            )
+            body = (f'<html><head><title>Page {index}</title></head>'
+                    f'<body><h1>Page {index}</h1>{links}</body></html>').encode('utf-8')
+            # 実際のサイトと同様に、偶数ページは gzip 圧縮して返す
+            compressed = index % 2 == 0 and 'gzip' in self.headers.get('Accept-Encoding', '')
+            if compressed:
+                body = gzip.compress(body)
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                if compressed:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except ConnectionError:
+                pass  # 停止させたワーカーの接続
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(page_count, delay):
+    """テスト用サイトを別スレッドで起動（ポートは空いているものを使う）"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(page_count, delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_crawl(start_url, shards, page_count, kill_after=None, kill_count=1):
+    """分散クロールを実行し、kill_after 件の結果を受け取った時点でワーカーを停止させる"""
+    coordinator = ShardCoordinator(shards=shards, threads_per_shard=2)
+    killed = []
+
+    def on_result(result):
+        if kill_after is not None and not killed and len(coordinator.results) >= kill_after:
+            for process in multiprocessing.active_children()[:kill_count]:
+                process.kill()
+                killed.append(process.pid)
+
+    start = time.time()
+    results = coordinator.crawl_website_with_progress(
+        start_url, page_count, lambda current, total, status: True, result_callback=on_result)
+    return results, killed, time.time() - start
+
+
+def check(name, condition, detail):
+    print(f"{'OK  ' if condition else 'NG  '} {name}: {detail}")
+    return condition
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分散クロールの動作確認')
+    parser.add_argument('--shards', type=int, default=3, help='ワーカープロセス数')
+    parser.add_argument('--pages', type=int, default=60, help='テスト用サイトのページ数')
+    parser.add_argument('--delay', type=float, default=0.05, help='1ページあたりの応答時間（秒）')
+    args = parser.parse_args(argv)
+
+    server = start_server(args.pages, args.delay)
+    start_url = f'http://127.0.0.1:{server.server_address[1]}/'
+    expected = {start_url} | {f'{start_url}page/{index}' for index in range(1, args.pages)}
+    passed = True
+
+    try:
+        # 全ワーカーが動作している場合
+        results, _, elapsed = run_crawl(start_url, args.shards, args.pages)
+        urls = [result['url'] for result in results]
+        passed &= check('全ページ収集', set(urls) == expected,
+                        f'{len(set(urls))}/{len(expected)}ページ（{elapsed:.2f}秒）')
+        passed &= check('重複なし', len(urls) == len(set(urls)), f'{len(urls)}件')
+        extracted = sum(result['title'] == f"Page {result['url'].rsplit('/', 1)[-1] or 0}"
+                        for result in results)
+        passed &= check('タイトル抽出（gzip圧縮ページを含む）', extracted == len(results),
+                        f'{extracted}/{len(results)}件')
+
+        # 途中で1ワーカーが停止した場合は残りのワーカーで完了する
+        results, killed, elapsed = run_crawl(start_url, args.shards, args.pages,
+                                             kill_after=args.pages // 4)
+        urls = [result['url'] for result in results]
+        passed &= check('ワーカー停止後も全ページ収集', bool(killed) and set(urls) == expected,
+                        f'停止 {len(killed)}件, {len(set(urls))}/{len(expected)}ページ（{elapsed:.2f}秒）')
+        passed &= check('ワーカー停止後も重複なし', len(urls) == len(set(urls)), f'{len(urls)}件')
+
+        # 全ワーカーが停止した場合は待ち続けずにエラーになる
+        start = time.time()
+        try:
+            run_crawl(start_url, args.shards, args.pages,
+                      kill_after=args.pages // 4, kill_count=args.shards)
+            error = None
+        except RuntimeError as e:
+            error = str(e)
+        passed &= check('全ワーカー停止でエラー', error is not None,
+                        f'{error}（{time.time() - start:.2f}秒）')
+    finally:
+        server.shutdown()
+
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
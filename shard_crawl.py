@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+複数プロセスによる分散クロール
+URLをコンシステントハッシュで複数のワーカープロセスに割り当て、
+コーディネーターが発見したリンクを担当ワーカーへ振り分けて結果を集約する
+"""
+
+import bisect
+import hashlib
+import multiprocessing
+import queue as queue_module
+import threading
+import time
+from collections import deque
+
+from crawler_web import WebCrawlerRender, CancelToken, MAX_QUEUE_SIZE
+from fetch_policy import FetchPolicy
+
+# ハッシュリング上の1ワーカーあたりの仮想ノード数
+VIRTUAL_NODES = 64
+
+# 終了時にワーカープロセスを待つ時間（秒）
+WORKER_JOIN_TIMEOUT = 2
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """コンシステントハッシュによるURLの割り当て"""
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        self._ring = sorted(
+            (_hash(f'{node}#{index}'), node)
+            for node in nodes
+            for index in range(virtual_nodes)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    def owner(self, url):
+        """URLを担当するノード"""
+        index = bisect.bisect(self._keys, _hash(url)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def _shard_worker(shard_id, start_url, threads, inbox, outbox, hedge=False):
+    """ワーカープロセス: 割り当てられたURLを取得して結果を返す
+
+    inbox から None を受け取ったスレッドは終了する
+    """
+    crawler = WebCrawlerRender(FetchPolicy(hedge=hedge))
+    crawler.start_hedging(threads)
+
+    def run():
+        while True:
+            url = inbox.get()
+            if url is None:
+                break
+            try:
+                result = crawler.process_page(url, start_url)
+            except Exception as e:
+                print(f"ワーカー{shard_id} 処理エラー {url}: {str(e)}")
+                result = None
+            outbox.put((shard_id, url, result))
+
+    workers = [threading.Thread(target=run, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    crawler.close()
+
+
+class ShardCoordinator:
+    """分散クロールのコーディネーター
+
+    WebCrawlerRender.crawl_website_with_progress と同じ呼び出し方で使える
+    """
+
+    def __init__(self, shards=2, threads_per_shard=3, hedge=False):
+        self.shards = shards
+        self.threads_per_shard = threads_per_shard
+        self.hedge = hedge
+        self.ring = HashRing(range(shards))
+        self.results = []
+        self.cancel_token = CancelToken()
+
+    def crawl_website_with_progress(self, start_url, max_pages=50, progress_callback=None,
+                                    max_workers=None, result_callback=None, cancel_token=None,
+                                    deadline=None):
+        """ウェブサイトを複数のワーカープロセスでクロール
+
+        max_workers はワーカーごとのスレッド数として扱う（省略時は threads_per_shard）
+        停止したワーカーの担当URLは残りのワーカーへ再割り当てし、
+        全ワーカーが停止した場合は RuntimeError を送出する
+        """
+        if progress_callback is None:
+            progress_callback = lambda current, total, status: True
+        threads = max_workers or self.threads_per_shard
+        self.cancel_token = cancel_token or CancelToken()
+        deadline_at = time.monotonic() + deadline if deadline else None
+        self.results = []
+
+        # fork はスレッドを持つFlaskプロセスでは安全でないため spawn を使う
+        context = multiprocessing.get_context('spawn')
+        inboxes = [context.Queue() for _ in range(self.shards)]
+        outbox = context.Queue()
+        processes = [
+            context.Process(target=_shard_worker,
+                            args=(shard_id, start_url, threads, inboxes[shard_id], outbox,
+                                  self.hedge),
+                            daemon=True)
+            for shard_id in range(self.shards)
+        ]
+        for process in processes:
+            process.start()
+
+        seen_urls = {start_url}
+        frontier = deque([start_url])
+        live_shards = list(range(self.shards))
+        self.ring = HashRing(live_shards)
+        pending = {shard_id: set() for shard_id in live_shards}  # ワーカーごとの処理中URL
+        capacity = self.shards * threads * 2  # ワーカーに同時に渡すURL数の上限
+
+        def report(status):
+            if progress_callback(len(self.results), max_pages, status) is False:
+                self.cancel_token.cancel()
+
+        def in_flight():
+            return sum(len(urls) for urls in pending.values())
+
+        def drop_dead_shards():
+            """停止したワーカーをハッシュリングから外し、処理中だったURLを再投入"""
+            dead = [shard_id for shard_id in live_shards if not processes[shard_id].is_alive()]
+            if not dead:
+                return
+            for shard_id in dead:
+                live_shards.remove(shard_id)
+                frontier.extendleft(pending.pop(shard_id))
+                print(f"ワーカー{shard_id}が停止しました（終了コード: {processes[shard_id].exitcode}）")
+            if not live_shards:
+                raise RuntimeError('すべてのワーカープロセスが終了しました')
+            self.ring = HashRing(live_shards)
+            report(f"ワーカー{', '.join(map(str, dead))}の担当分を再割り当てしました")
+
+        try:
+            report(f"分散クロール開始（{self.shards}ワーカー）...")
+
+            while len(self.results) < max_pages and not self.cancel_token.is_cancelled():
+                if deadline_at is not None and time.monotonic() >= deadline_at:
+                    break
+
+                # 担当ワーカーへURLを振り分け
+                while frontier and in_flight() < capacity and len(self.results) + in_flight() < max_pages:
+                    url = frontier.popleft()
+                    shard_id = self.ring.owner(url)
+                    inboxes[shard_id].put(url)
+                    pending[shard_id].add(url)
+
+                if in_flight() == 0:
+                    break
+
+                try:
+                    shard_id, url, result = outbox.get(timeout=0.2)
+                except queue_module.Empty:
+                    drop_dead_shards()
+                    continue
+                if url not in pending.get(shard_id, ()):
+                    continue  # 停止したワーカーから遅れて届いた結果（再投入済み）
+                pending[shard_id].discard(url)
+                if not result:
+                    continue
+
+                new_links = result.pop('new_links', [])
+                self.results.append(result)
+                if result_callback:
+                    result_callback(result)
+                report(f"分散収集中: {len(self.results)}/{max_pages}ページ完了")
+
+                for link in new_links:
+                    if len(frontier) >= MAX_QUEUE_SIZE * self.shards:  # キューサイズ制限
+                        break
+                    if link not in seen_urls:
+                        seen_urls.add(link)
+                        frontier.append(link)
+        finally:
+            self._stop_workers(processes, inboxes, threads)
+
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            status = f"制限時間に達しました: {len(self.results)}件のページを収集済み"
+        elif self.cancel_token.is_cancelled():
+            status = f"中断しました: {len(self.results)}件のページを収集済み"
+        else:
+            status = f"分散クロール完了！ {len(self.results)}件のページを収集しました"
+        progress_callback(len(self.results), max_pages, status)
+        return self.results
+
+    def _stop_workers(self, processes, inboxes, threads):
+        """ワーカープロセスを終了（中断時は待たずに停止）"""
+        if self.cancel_token.is_cancelled():
+            for process in processes:
+                process.terminate()
+        else:
+            for inbox in inboxes:
+                for _ in range(threads):
+                    inbox.put(None)
+        for process in processes:
+            process.join(WORKER_JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        # 未処理のURLが残っていても終了時に待たない
+        for inbox in inboxes:
+            inbox.cancel_join_thread()
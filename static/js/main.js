@@ -37,20 +37,10 @@ document.addEventListener("DOMContentLoaded", function () {
     }, 5000);
   });
 
-  // テーブルのソート機能（簡単な実装）
-  const table = document.querySelector("table");
-  if (table) {
-    const headers = table.querySelectorAll("th");
-    headers.forEach(function (header, index) {
-      header.classList.add(
-        "cursor-pointer",
-        "hover:bg-gray-100",
-        "transition-colors"
-      );
-      header.addEventListener("click", function () {
-        sortTable(table, index);
-      });
-    });
+  // 結果テーブル（サーバー側で並び替え・絞り込み・ページング）
+  const resultsTable = document.getElementById("results-table");
+  if (resultsTable) {
+    initResultsTable(resultsTable);
   }
 
   // アニメーション効果
@@ -66,20 +56,174 @@ document.addEventListener("DOMContentLoaded", function () {
   });
 });
 
-// テーブルソート関数
-function sortTable(table, column) {
-  const tbody = table.querySelector("tbody");
-  const rows = Array.from(tbody.querySelectorAll("tr"));
+// 結果テーブルの初期化
+function initResultsTable(table) {
+  const state = {
+    page: 1,
+    perPage: parseInt(table.dataset.perPage, 10) || 50,
+    sort: "",
+    order: "asc",
+  };
+  const filterForm = document.getElementById("results-filter");
+
+  table.querySelectorAll("th[data-sort]").forEach(function (header) {
+    header.addEventListener("click", function () {
+      const field = header.dataset.sort;
+      state.order = state.sort === field && state.order === "asc" ? "desc" : "asc";
+      state.sort = field;
+      state.page = 1;
+      loadResultsPage(table, state);
+    });
+  });
+
+  if (filterForm) {
+    filterForm.addEventListener("submit", function (event) {
+      event.preventDefault();
+    });
+    filterForm.addEventListener("change", function () {
+      state.page = 1;
+      loadResultsPage(table, state);
+    });
+  }
+
+  document.getElementById("results-prev").addEventListener("click", function () {
+    if (state.page > 1) {
+      state.page -= 1;
+      loadResultsPage(table, state);
+    }
+  });
+  document.getElementById("results-next").addEventListener("click", function () {
+    state.page += 1;
+    loadResultsPage(table, state);
+  });
+
+  loadResultsPage(table, state);
+}
 
-  rows.sort(function (a, b) {
-    const aText = a.cells[column].textContent.trim();
-    const bText = b.cells[column].textContent.trim();
-    return aText.localeCompare(bText);
+// 結果を1ページ分取得して表示
+function loadResultsPage(table, state) {
+  const params = new URLSearchParams({
+    page: state.page,
+    per_page: state.perPage,
+    sort: state.sort,
+    order: state.order,
   });
+  const filterForm = document.getElementById("results-filter");
+  if (filterForm) {
+    new FormData(filterForm).forEach(function (value, key) {
+      if (value) {
+        params.set(key, value);
+      }
+    });
+  }
+
+  fetch(table.dataset.apiUrl + "?" + params.toString())
+    .then((response) => response.json())
+    .then((data) => {
+      state.page = data.page;
+      renderResultRows(table.querySelector("tbody"), data.items);
 
-  rows.forEach(function (row) {
-    tbody.appendChild(row);
+      document.getElementById("results-page-info").textContent =
+        data.page + " / " + data.pages + " ページ";
+      document.getElementById("results-filtered-count").textContent =
+        data.total + "件該当";
+      document.getElementById("results-prev").disabled = data.page <= 1;
+      document.getElementById("results-next").disabled = data.page >= data.pages;
+
+      table.querySelectorAll("th[data-sort]").forEach(function (header) {
+        const label = header.textContent.replace(/[▲▼]/g, "").trim();
+        if (header.dataset.sort === state.sort) {
+          header.textContent = label + (state.order === "asc" ? " ▲" : " ▼");
+        } else {
+          header.textContent = label;
+        }
+      });
+    })
+    .catch((error) => {
+      console.error("結果取得エラー:", error);
+    });
+}
+
+// 文字列を指定文字数で切り詰め
+function truncateText(text, length) {
+  text = text || "";
+  return text.length > length ? text.slice(0, length) + "..." : text;
+}
+
+// バッジ要素を作成
+function createBadge(text, colorClass) {
+  const badge = document.createElement("span");
+  badge.className =
+    "inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium " + colorClass;
+  badge.textContent = text;
+  return badge;
+}
+
+// 結果行を描画
+function renderResultRows(tbody, items) {
+  const fragment = document.createDocumentFragment();
+
+  items.forEach(function (result) {
+    const row = document.createElement("tr");
+    row.className = "hover:bg-gray-50 transition-colors duration-150";
+
+    const urlCell = document.createElement("td");
+    urlCell.className = "px-6 py-4 whitespace-nowrap";
+    const link = document.createElement("a");
+    link.href = result.url;
+    link.target = "_blank";
+    link.className = "text-blue-600 hover:text-blue-800 text-sm font-medium truncate max-w-xs block";
+    link.textContent = truncateText(result.url, 50);
+    urlCell.appendChild(link);
+    row.appendChild(urlCell);
+
+    [
+      [result.title, 30],
+      [result.h1, 20],
+      [result.h2_1, 20],
+      [result.h2_2, 20],
+      [result.h2_3, 20],
+      [result.canonical_url, 30],
+    ].forEach(function ([text, length]) {
+      const cell = document.createElement("td");
+      cell.className = "px-6 py-4 text-sm text-gray-900 max-w-xs";
+      const inner = document.createElement("div");
+      inner.className = "truncate";
+      inner.textContent = truncateText(text, length);
+      cell.appendChild(inner);
+      row.appendChild(cell);
+    });
+
+    const redirectCell = document.createElement("td");
+    redirectCell.className = "px-6 py-4 text-sm text-gray-900 max-w-xs";
+    redirectCell.appendChild(
+      result.is_redirect
+        ? createBadge("リダイレクト", "bg-yellow-100 text-yellow-800")
+        : createBadge("直接", "bg-green-100 text-green-800")
+    );
+    row.appendChild(redirectCell);
+
+    const indexCell = document.createElement("td");
+    indexCell.className = "px-6 py-4 whitespace-nowrap";
+    indexCell.appendChild(
+      createBadge(
+        result.index_status,
+        result.index_status === "indexable"
+          ? "bg-green-100 text-green-800"
+          : "bg-yellow-100 text-yellow-800"
+      )
+    );
+    row.appendChild(indexCell);
+
+    const codeCell = document.createElement("td");
+    codeCell.className = "px-6 py-4 whitespace-nowrap text-sm text-gray-900";
+    codeCell.textContent = result.status_code;
+    row.appendChild(codeCell);
+
+    fragment.appendChild(row);
   });
+
+  tbody.replaceChildren(fragment);
 }
 
 // ユーティリティ関数